@@ -1,223 +1,1102 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from itertools import chain, islice
+import os
+import queue
+import re
 import sqlite3
-from typing import Iterable, List, Dict, Any, Optional
-from datetime import date, datetime
+import sys
+import threading
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple
+from datetime import date
 
 DB_PATH = Path(__file__).with_name("accurate_sales.db")
 
+# Jumlah maksimal koneksi di pool. SQLite tetap serialize writer, jadi
+# sebanyak CPU sudah cukup untuk reader paralel (mode WAL).
+POOL_SIZE = os.cpu_count() or 4
 
-def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
-    """Buka koneksi ke database SQLite."""
+# Batas tunggu (detik) kalau semua koneksi pool sedang dipinjam. Lewat dari
+# ini acquire() gagal dengan OperationalError, bukan menunggu selamanya.
+POOL_TIMEOUT = 30.0
+
+# Urutan kolom hasil fetch_sales (sama dengan urutan SELECT di _SQL_FETCH_SALES).
+# Nama kolom di-intern sekali, jadi key dict hasil fetch_sales selalu objek
+# string yang sama (lookup cukup cek pointer).
+SALES_COLUMNS = tuple(
+    sys.intern(c)
+    for c in (
+        "invoice_date",
+        "invoice_no",
+        "customer",
+        "salesman",
+        "item",
+        "qty",
+        "amount",
+        "item_category",
+        "city",
+        "customer_type",
+    )
+)
+
+# Selisih julianday() SQLite dengan date.toordinal() Python:
+# julianday('0001-01-01') = 1721425.5, sedangkan date(1, 1, 1).toordinal() = 1
+_JULIANDAY_OFFSET = 1721424.5
+
+# Jumlah baris per 1 statement INSERT multi-VALUES saat bulk insert.
+# 12 placeholder per baris -> 2700 baris = 32400 parameter, masih di bawah
+# SQLITE_MAX_VARIABLE_NUMBER (32766). Dibatasi lagi oleh limit koneksi.
+INSERT_ROWS_PER_STATEMENT = 2_700
+
+_SQL_INSERT_SALES_PREFIX = """
+    INSERT INTO sales_detail (
+        invoice_date,
+        invoice_date_raw,
+        invoice_no,
+        customer,
+        salesman,
+        item,
+        qty,
+        amount,
+        item_category,
+        city,
+        customer_type,
+        access_code
+    )
+    VALUES
+"""
+_SQL_INSERT_SALES_ROW = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_SALES_INSERT_PARAMS = _SQL_INSERT_SALES_ROW.count("?")
+
+_SQL_INSERT_SALES = _SQL_INSERT_SALES_PREFIX + _SQL_INSERT_SALES_ROW + ";"
+
+# invoice_date (nomor hari) dikembalikan lagi ke teks YYYY-MM-DD oleh SQLite,
+# hanya untuk baris yang memang dikembalikan. Tanggal yang tidak terbaca (0)
+# dikembalikan sebagai teks aslinya (invoice_date_raw).
+_SQL_FETCH_SALES = f"""
+    SELECT
+        CASE
+            WHEN invoice_date > 0 THEN date(invoice_date + {_JULIANDAY_OFFSET})
+            ELSE invoice_date_raw
+        END,
+        invoice_no,
+        customer,
+        salesman,
+        item,
+        qty,
+        amount,
+        item_category,
+        city,
+        customer_type
+    FROM sales_detail
+    WHERE access_code = ?
+"""
+
+_SQL_FETCH_SALES_RANGE = _SQL_FETCH_SALES + " AND invoice_date BETWEEN ? AND ?"
+
+# Agregasi dashboard langsung di SQLite: tiap query hanya mengembalikan
+# angka / Top N yang memang ditampilkan, bukan baris faktur.
+# Placeholder: access_code, batas bawah & atas invoice_date (nomor hari).
+_SQL_DASHBOARD_SUMMARY = """
+    SELECT COALESCE(SUM(amount), 0), COUNT(DISTINCT NULLIF(customer, ''))
+    FROM sales_detail
+    WHERE access_code = ? AND invoice_date BETWEEN ? AND ?
+"""
+
+# Top N per dimensi ({col} dari DASHBOARD_DIMENSIONS, bukan input user).
+# Placeholder tambahan terakhir: N.
+_SQL_DASHBOARD_TOP = """
+    SELECT {col}, COALESCE(SUM(amount), 0) AS total
+    FROM sales_detail
+    WHERE access_code = ? AND invoice_date BETWEEN ? AND ? AND {col} <> ''
+    GROUP BY {col}
+    ORDER BY total DESC, {col}
+    LIMIT ?
+"""
+
+# Bulan ini vs bulan lalu. Rentang invoice_date dimulai dari awal bulan lalu,
+# placeholder pertama = nomor hari awal bulan ini (>= -> bulan ini).
+_SQL_DASHBOARD_MONTH_TOTALS = """
+    SELECT
+        COALESCE(SUM(CASE WHEN invoice_date >= ?1 THEN amount END), 0),
+        COALESCE(SUM(CASE WHEN invoice_date < ?1 THEN amount END), 0)
+    FROM sales_detail
+    WHERE access_code = ?2 AND invoice_date BETWEEN ?3 AND ?4
+"""
+
+# Top 10 per dimensi bulan ini, beserta nilai bulan lalu. Label yang hanya
+# ada di bulan lalu ikut dengan current = 0, tapi kalah urutan dari label
+# bulan ini yang nilainya sama (in_cur).
+_SQL_DASHBOARD_MOM_TOP = """
+    SELECT
+        {col},
+        COALESCE(SUM(CASE WHEN invoice_date >= ?1 THEN amount END), 0) AS cur,
+        COALESCE(SUM(CASE WHEN invoice_date < ?1 THEN amount END), 0) AS prev,
+        MAX(invoice_date >= ?1) AS in_cur
+    FROM sales_detail
+    WHERE access_code = ?2 AND invoice_date BETWEEN ?3 AND ?4 AND {col} <> ''
+    GROUP BY {col}
+    ORDER BY cur DESC, in_cur DESC, {col}
+    LIMIT ?5
+"""
+
+# Dimensi Top N dashboard (nama kolom sales_detail)
+DASHBOARD_DIMENSIONS = (
+    "customer",
+    "customer_type",
+    "city",
+    "salesman",
+    "item",
+    "item_category",
+)
+
+# Teks SQL per dimensi dirakit sekali di sini (bukan .format per request),
+# jadi tiap query selalu string yang sama dan langsung kena statement cache
+_SQL_DASHBOARD_TOP_BY_COL = {
+    col: _SQL_DASHBOARD_TOP.format(col=col) for col in DASHBOARD_DIMENSIONS
+}
+_SQL_DASHBOARD_MOM_TOP_BY_COL = {
+    col: _SQL_DASHBOARD_MOM_TOP.format(col=col) for col in ("item", "salesman")
+}
+
+# Tanggal terakhir (nomor hari) untuk menentukan "bulan ini" dashboard.
+# MAX di idx_sales_covering (access_code, invoice_date) cukup 1x seek.
+_SQL_LAST_INVOICE_DATE = """
+    SELECT MAX(invoice_date)
+    FROM sales_detail
+    WHERE access_code = ? AND invoice_date > 0
+"""
+
+_SQL_LAST_INVOICE_DATE_RANGE = _SQL_LAST_INVOICE_DATE + " AND invoice_date BETWEEN ? AND ?"
+
+_SQL_UPSERT_CODE = """
+    INSERT INTO access_codes (code, customer_name, active, valid_from, valid_to)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(code) DO UPDATE SET
+        customer_name = excluded.customer_name,
+        active        = excluded.active,
+        valid_from    = excluded.valid_from,
+        valid_to      = excluded.valid_to;
+"""
+
+_SQL_ACTIVE_CODE_WHERE = """
+    WHERE
+        code = ?
+        AND active = 1
+        AND (valid_from IS NULL OR valid_from <= ?)
+        AND (valid_to   IS NULL OR valid_to   >= ?)
+"""
+
+_ACCESS_CODE_COLUMNS = ("code", "customer_name", "active", "valid_from", "valid_to")
+
+_SQL_GET_CODE = (
+    f"SELECT {', '.join(_ACCESS_CODE_COLUMNS)} FROM access_codes"
+    + _SQL_ACTIVE_CODE_WHERE
+)
+
+# EXISTS: SQLite berhenti di baris pertama yang cocok, hasilnya 1 integer (0/1)
+_SQL_CHECK_CODE = "SELECT EXISTS(SELECT 1 FROM access_codes" + _SQL_ACTIVE_CODE_WHERE + ")"
+
+
+def get_connection(
+    db_path: Optional[Path] = None,
+    check_same_thread: bool = True,
+) -> sqlite3.Connection:
+    """
+    Buka koneksi ke database SQLite.
+    check_same_thread=False dipakai kalau koneksi dipakai lintas thread
+    (misal generator StreamingResponse yang dijalankan di threadpool).
+    """
     if db_path is None:
         db_path = DB_PATH
-    conn = sqlite3.connect(db_path)
-    # Supaya hasil query bisa diakses dengan nama kolom
-    conn.row_factory = sqlite3.Row
+    # cached_statements: SQL yang sama (konstanta _SQL_*) tidak di-compile ulang
+    conn = sqlite3.connect(
+        db_path,
+        cached_statements=256,
+        check_same_thread=check_same_thread,
+    )
+    # Tanpa row_factory (tuple biasa, paling cepat). Yang butuh dict
+    # memasangkan sendiri dengan daftar kolom (SALES_COLUMNS, dll).
+    # Transaksi diatur manual (BEGIN ... COMMIT), tidak implicit dari modul sqlite3
+    conn.isolation_level = None
+    # WAL + synchronous=NORMAL: bulk insert jauh lebih cepat, reader tidak
+    # terblokir writer
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;  -- ~64 MB page cache
+        PRAGMA analysis_limit=1000;  -- ANALYZE cukup sampling, tidak scan penuh
+        """
+    )
     return conn
 
 
-def init_db(conn: sqlite3.Connection) -> None:
-    """Buat tabel-tabel kalau belum ada + migrate kolom access_code untuk multi-tenant."""
-    cur = conn.cursor()
+# ------------------ Transaksi ------------------
 
-    # Tabel utama data penjualan
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS sales_detail (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            invoice_date      TEXT    NOT NULL,
-            invoice_no        TEXT    NOT NULL,
-            customer          TEXT,
-            salesman          TEXT,
-            item              TEXT,
-            qty               REAL,
-            amount            REAL,
-            item_category     TEXT,
-            city              TEXT,
-            customer_type     TEXT
-            -- kolom access_code akan ditambahkan via ALTER TABLE di bawah
-        );
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    """
+    BEGIN IMMEDIATE ... COMMIT (ROLLBACK kalau error).
+    Kalau koneksi sudah di dalam transaksi (misal batch di writer thread),
+    pakai SAVEPOINT supaya tetap ikut 1 COMMIT milik pemanggil.
+    """
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT tx;")
+        try:
+            yield
+        except Exception:
+            conn.execute("ROLLBACK TO tx;")
+            conn.execute("RELEASE tx;")
+            raise
+        conn.execute("RELEASE tx;")
+        return
+
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        yield
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+# ------------------ Pool koneksi ------------------
+
+_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+_pool_lock = threading.Lock()
+_pool_created = 0
+
+
+def _take_connection() -> sqlite3.Connection:
+    """Ambil koneksi nganggur dari pool, buka baru kalau belum penuh, atau tunggu."""
+    global _pool_created
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        pass
+
+    with _pool_lock:
+        if _pool_created < POOL_SIZE:
+            conn = get_connection(check_same_thread=False)
+            _pool_created += 1
+            return conn
+
+    try:
+        return _pool.get(timeout=POOL_TIMEOUT)
+    except queue.Empty:
+        raise sqlite3.OperationalError(
+            f"Tidak ada koneksi pool yang bebas setelah {POOL_TIMEOUT:g} detik"
+        ) from None
+
+
+@contextmanager
+def acquire() -> Iterator[sqlite3.Connection]:
+    """
+    Pinjam koneksi dari pool:
+
+        with acquire() as conn:
+            ...
+
+    Koneksi dibuka sekali (PRAGMA + statement cache tetap hidup antar request)
+    dan dikembalikan ke pool setelah blok with selesai.
+    """
+    conn = _take_connection()
+    try:
+        yield conn
+    finally:
+        # Jangan kembalikan koneksi dengan transaksi yang masih menggantung
+        if conn.in_transaction:
+            conn.rollback()
+        _pool.put(conn)
+
+
+def close_pool() -> None:
+    """
+    Tutup semua koneksi nganggur di pool (dipanggil saat app shutdown).
+    PRAGMA optimize dulu supaya statistik planner ikut disimpan ke file DB.
+    """
+    global _pool_created
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            conn.execute("PRAGMA optimize;")
+        finally:
+            conn.close()
+        with _pool_lock:
+            _pool_created -= 1
+
+
+# ------------------ Writer thread ------------------
+#
+# Semua penulisan dari HTTP worker dilewatkan ke 1 thread penulis. SQLite
+# tetap serialize writer, jadi worker tidak perlu antre lock + fsync sendiri:
+# job yang menumpuk di queue di-drain lalu di-COMMIT sekali jalan.
+# Reader tetap pakai koneksi pool (WAL), tidak terganggu writer.
+
+
+class _WriteJob:
+    __slots__ = ("func", "args", "done", "error", "result")
+
+    def __init__(self, func, args: tuple) -> None:
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.result: Any = None
+
+
+_write_queue: "queue.Queue[_WriteJob]" = queue.Queue()
+_writer_lock = threading.Lock()
+_writer_thread: Optional[threading.Thread] = None
+
+
+def _writer_loop() -> None:
+    conn = get_connection(check_same_thread=False)
+    while True:
+        jobs = [_write_queue.get()]
+        while True:
+            try:
+                jobs.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            for job in jobs:
+                # Tiap job jalan di SAVEPOINT sendiri: job yang gagal di tengah
+                # jalan dibatalkan seluruhnya, tanpa membatalkan job lain di
+                # batch yang sama.
+                conn.execute("SAVEPOINT job;")
+                try:
+                    job.result = job.func(conn, *job.args)
+                except Exception as e:
+                    job.error = e
+                    conn.execute("ROLLBACK TO job;")
+                conn.execute("RELEASE job;")
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for job in jobs:
+                job.error = job.error or e
+        finally:
+            for job in jobs:
+                job.done.set()
+
+
+def _ensure_writer() -> None:
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(
+                target=_writer_loop, name="sqlite-writer", daemon=True
+            )
+            _writer_thread.start()
+
+
+def submit_write(func, *args, wait: bool = True) -> Any:
+    """
+    Jalankan func(conn, *args) di writer thread, contoh:
+
+        n = submit_write(insert_rows, rows, access_code)
+
+    wait=True  -> tunggu sampai batch-nya di-COMMIT, kembalikan hasil func
+                  (error job di-raise ulang)
+    wait=False -> langsung balik, kembalikan Event yang di-set setelah COMMIT
+    """
+    _ensure_writer()
+    job = _WriteJob(func, args)
+    _write_queue.put(job)
+    if not wait:
+        return job.done
+    job.done.wait()
+    if job.error is not None:
+        raise job.error
+    return job.result
+
+
+# Index sekunder sales_detail (dibuat di init_db).
+#
+# idx_sales_covering: (access_code, invoice_date) + semua kolom yang di-SELECT
+# fetch_sales, jadi query dashboard cukup index-only scan (tanpa lookup ke
+# tabel). Satu-satunya index sekunder: semua query (termasuk DELETE di
+# clear_sales) memfilter access_code, jadi index lain tidak pernah dipakai
+# planner tapi tetap harus di-update di tiap insert.
+_SALES_INDEXES = (
+    (
+        "idx_sales_covering",
+        "access_code, invoice_date, invoice_no, customer, salesman, item,"
+        " qty, amount, item_category, city, customer_type, invoice_date_raw",
+    ),
+)
+
+
+# Skema tabel utama data penjualan.
+# invoice_date disimpan sebagai INTEGER: nomor hari (date.toordinal()),
+# 0 = tanggal tidak terbaca. Filter periode jadi perbandingan integer biasa.
+# invoice_date_raw: teks tanggal asli, hanya diisi kalau invoice_date = 0.
+# amount disimpan sebagai INTEGER rupiah (tanpa pecahan), jadi SUM eksak.
+_SALES_DETAIL_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_date      INTEGER NOT NULL,
+        invoice_date_raw  TEXT,
+        invoice_no        TEXT    NOT NULL,
+        customer          TEXT,
+        salesman          TEXT,
+        item              TEXT,
+        qty               REAL,
+        amount            INTEGER,
+        item_category     TEXT,
+        city              TEXT,
+        customer_type     TEXT,
+        access_code       TEXT
+    );
+"""
+
+def _migrate_sales_dates(conn: sqlite3.Connection) -> None:
+    """
+    Migrasi sales_detail versi lama (invoice_date TEXT) ke invoice_date INTEGER.
+    Tanggal dibaca dengan aturan yang sama dengan insert_rows (_to_ordinal,
+    didaftarkan sebagai fungsi SQL); teks yang tidak terbaca disimpan apa
+    adanya di invoice_date_raw. amount ikut diubah ke INTEGER rupiah.
+    """
+    conn.create_function("to_ordinal", 1, _to_ordinal, deterministic=True)
+    with _transaction(conn):
+        _rebuild_sales_detail(
+            conn,
+            "to_ordinal(invoice_date)",
+            "CASE WHEN to_ordinal(invoice_date) = 0 THEN invoice_date END",
+        )
+
+
+def _migrate_sales_amounts(conn: sqlite3.Connection) -> None:
+    """Migrasi sales_detail versi lama (amount REAL) ke amount INTEGER rupiah."""
+    with _transaction(conn):
+        _rebuild_sales_detail(conn, "invoice_date", "invoice_date_raw")
+
+
+def _rebuild_sales_detail(
+    conn: sqlite3.Connection,
+    invoice_date_expr: str,
+    invoice_date_raw_expr: str,
+) -> None:
+    """
+    Bangun ulang sales_detail dengan skema terbaru (_SALES_DETAIL_DDL).
+    invoice_date_expr / invoice_date_raw_expr: ekspresi SQL untuk nilai
+    invoice_date / invoice_date_raw yang baru.
+    Dipanggil di dalam transaksi (lihat _migrate_*).
+    """
+    conn.execute(_SALES_DETAIL_DDL.format(table="sales_detail_new"))
+    conn.execute(
+        f"""
+        INSERT INTO sales_detail_new (
+            id, invoice_date, invoice_date_raw, invoice_no, customer, salesman,
+            item, qty, amount, item_category, city, customer_type, access_code
+        )
+        SELECT
+            id,
+            {invoice_date_expr},
+            {invoice_date_raw_expr},
+            invoice_no, customer, salesman, item,
+            qty, CAST(ROUND(amount) AS INTEGER), item_category, city, customer_type, access_code
+        FROM sales_detail;
         """
     )
+    conn.execute("DROP TABLE sales_detail;")
+    conn.execute("ALTER TABLE sales_detail_new RENAME TO sales_detail;")
+
+
+# Tabel kode akses (lisensi)
+# Selalu dicari berdasarkan code -> code jadi PRIMARY KEY + WITHOUT ROWID,
+# jadi lookup cukup 1x descent B-tree (tanpa index terpisah).
+_ACCESS_CODES_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        code TEXT PRIMARY KEY,
+        customer_name TEXT,
+        active INTEGER NOT NULL DEFAULT 1,
+        valid_from TEXT,  -- format YYYY-MM-DD, boleh NULL
+        valid_to   TEXT   -- format YYYY-MM-DD, boleh NULL
+    ) WITHOUT ROWID;
+"""
+
+# JSON dashboard (tanpa filter tanggal) per access_code, dihitung sekali
+# setelah data berubah (saat pertama kali dibaca, di luar transaksi upload).
+# - generation: naik setiap data sales access_code itu berubah (clear_sales &
+#   insert_rows) sekaligus mengosongkan data. JSON hanya disimpan kalau
+#   generation-nya masih sama dengan saat mulai dihitung, jadi hasil hitungan
+#   dari data lama tidak pernah tersimpan.
+# - version: versi bentuk JSON dari pemanggil; baris dengan versi lain
+#   diabaikan (dihitung ulang), jadi tidak perlu upload ulang setelah deploy.
+_DASHBOARD_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS dashboard_cache (
+        access_code TEXT PRIMARY KEY,
+        generation  INTEGER NOT NULL DEFAULT 0,
+        version     INTEGER NOT NULL DEFAULT 0,
+        data        BLOB,
+        updated_at  TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID;
+"""
 
-    # Cek apakah kolom access_code sudah ada, kalau belum tambahkan
+_SQL_INVALIDATE_DASHBOARD_CACHE = """
+    INSERT INTO dashboard_cache (access_code, generation) VALUES (?, 1)
+    ON CONFLICT(access_code) DO UPDATE SET
+        generation = generation + 1,
+        data       = NULL,
+        updated_at = CURRENT_TIMESTAMP;
+"""
+
+_SQL_STORE_DASHBOARD_CACHE = """
+    INSERT INTO dashboard_cache (access_code, generation, version, data)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(access_code) DO UPDATE SET
+        version    = excluded.version,
+        data       = excluded.data,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE generation = excluded.generation;
+"""
+
+# DDL init_db dikirim lewat executescript (1x panggilan per blok, bukan
+# 1x execute per statement). Index dibuat setelah migrasi kolom lama.
+_SQL_INIT_TABLES = (
+    _SALES_DETAIL_DDL.format(table="sales_detail")
+    + _ACCESS_CODES_DDL.format(table="access_codes")
+    + _DASHBOARD_CACHE_DDL
+)
+
+_SQL_INIT_INDEXES = "\n".join(
+    [
+        # diganti idx_sales_covering
+        "DROP INDEX IF EXISTS idx_sales_date;",
+        "DROP INDEX IF EXISTS idx_sales_access_code;",
+        "DROP INDEX IF EXISTS idx_sales_customer;",
+        "DROP INDEX IF EXISTS idx_sales_salesman;",
+        "DROP INDEX IF EXISTS idx_sales_item;",
+        *(
+            f"CREATE INDEX IF NOT EXISTS {name} ON sales_detail({columns});"
+            for name, columns in _SALES_INDEXES
+        ),
+        "DROP INDEX IF EXISTS idx_access_code;",  # code sudah PRIMARY KEY
+    ]
+)
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Buat tabel-tabel kalau belum ada + migrate skema lama (access_code, invoice_date)."""
+    cur = conn.cursor()
+
+    # Tabel utama data penjualan + tabel kode akses
+    cur.executescript(_SQL_INIT_TABLES)
+
+    # Cek apakah kolom access_code sudah ada (DB lama), kalau belum tambahkan
     cur.execute("PRAGMA table_info(sales_detail);")
-    cols = [row[1] for row in cur.fetchall()]
-    if "access_code" not in cols:
+    col_types = {row[1]: row[2].upper() for row in cur.fetchall()}
+    if "access_code" not in col_types:
         cur.execute("ALTER TABLE sales_detail ADD COLUMN access_code TEXT;")
 
-    # Index-index
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_sales_date ON sales_detail(invoice_date);"
-    )
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales_detail(customer);"
-    )
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_sales_salesman ON sales_detail(salesman);"
-    )
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_sales_item ON sales_detail(item);"
-    )
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_sales_access_code ON sales_detail(access_code);"
-    )
+    # DB lama menyimpan invoice_date sebagai TEXT / amount sebagai REAL
+    # -> migrasi sekali ke INTEGER (migrasi tanggal sekaligus mengubah amount)
+    if col_types.get("invoice_date") == "TEXT":
+        _migrate_sales_dates(conn)
+    else:
+        if "invoice_date_raw" not in col_types:
+            cur.execute("ALTER TABLE sales_detail ADD COLUMN invoice_date_raw TEXT;")
+        if col_types.get("amount") == "REAL":
+            _migrate_sales_amounts(conn)
 
-    # Tabel kode akses (lisensi)
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS access_codes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT UNIQUE NOT NULL,
-            customer_name TEXT,
-            active INTEGER NOT NULL DEFAULT 1,
-            valid_from TEXT,  -- format YYYY-MM-DD, boleh NULL
-            valid_to   TEXT   -- format YYYY-MM-DD, boleh NULL
-        );
-        """
-    )
-    cur.execute(
-        "CREATE INDEX IF NOT EXISTS idx_access_code ON access_codes(code);"
-    )
+    # Migrasi tabel access_codes versi lama (id AUTOINCREMENT + UNIQUE(code))
+    cur.execute("PRAGMA table_info(access_codes);")
+    code_cols = [row[1] for row in cur.fetchall()]
+    if "id" in code_cols:
+        with _transaction(conn):
+            cur.execute(_ACCESS_CODES_DDL.format(table="access_codes_new"))
+            cur.execute(
+                """
+                INSERT INTO access_codes_new (code, customer_name, active, valid_from, valid_to)
+                SELECT code, customer_name, active, valid_from, valid_to
+                FROM access_codes;
+                """
+            )
+            cur.execute("DROP TABLE access_codes;")
+            cur.execute("ALTER TABLE access_codes_new RENAME TO access_codes;")
 
-    conn.commit()
+    # dashboard_cache versi lama (tanpa generation / version) hanya berisi
+    # cache, jadi cukup dibuat ulang kosong
+    cur.execute("PRAGMA table_info(dashboard_cache);")
+    if "generation" not in [row[1] for row in cur.fetchall()]:
+        cur.execute("DROP TABLE dashboard_cache;")
+        cur.executescript(_DASHBOARD_CACHE_DDL)
+
+    # Index-index. Index lama yang kolomnya sudah beda dari _SALES_INDEXES
+    # di-drop dulu supaya dibuat ulang dengan definisi terbaru.
+    for name, columns in _SALES_INDEXES:
+        existing = [row[2] for row in cur.execute(f"PRAGMA index_info({name});")]
+        if existing and existing != [c.strip() for c in columns.split(",")]:
+            cur.execute(f"DROP INDEX {name};")
+    cur.executescript(_SQL_INIT_INDEXES)
 
 
 def clear_sales(conn: sqlite3.Connection, access_code: str) -> None:
     """
     Hapus data hanya untuk 1 customer (berdasarkan access_code).
     Dipakai saat user centang "Hapus data lama sebelum import".
+    Index tidak di-drop: index dipakai bersama semua access_code, jadi
+    membangunnya ulang berarti membaca data semua customer.
     """
-    cur = conn.cursor()
-    cur.execute("DELETE FROM sales_detail WHERE access_code = ?;", (access_code,))
-    conn.commit()
+    with _transaction(conn):
+        conn.execute("DELETE FROM sales_detail WHERE access_code = ?;", (access_code,))
+        conn.execute(_SQL_INVALIDATE_DASHBOARD_CACHE, (access_code,))
+
+
+@lru_cache(maxsize=8)
+def _sql_insert_sales_multi(n_rows: int) -> str:
+    """INSERT ... VALUES (...), (...), ... untuk n_rows baris sekaligus."""
+    return _SQL_INSERT_SALES_PREFIX + ",".join([_SQL_INSERT_SALES_ROW] * n_rows) + ";"
 
 
-def insert_rows(conn: sqlite3.Connection, rows: Iterable[tuple], access_code: str) -> None:
+def _insert_rows_per_statement(conn: sqlite3.Connection) -> int:
+    """Baris per INSERT multi-VALUES, disesuaikan dengan limit parameter SQLite."""
+    try:
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    except AttributeError:  # Python < 3.11, pakai limit default SQLite lama
+        limit = 999
+    return max(1, min(INSERT_ROWS_PER_STATEMENT, limit // _SALES_INSERT_PARAMS))
+
+
+def insert_rows(conn: sqlite3.Connection, rows: Iterable[tuple], access_code: str) -> int:
     """
     Insert banyak baris ke tabel sales_detail untuk 1 customer (access_code tertentu).
     Parameter rows diasumsikan 10 kolom pertama (tanpa access_code),
     nanti di-append access_code di sini.
+    invoice_date diubah ke nomor hari (date.toordinal()); kalau tidak
+    terbaca disimpan 0 + teks aslinya di invoice_date_raw.
+    rows boleh generator: diproses per batch, jadi tidak pernah ditampung
+    semua di memori. Tiap batch penuh ditulis dengan 1 statement
+    INSERT multi-VALUES; sisa batch terakhir pakai executemany biasa.
+    Mengembalikan jumlah baris yang di-insert.
     """
-    rows = list(rows)
-    if not rows:
-        return
+    rows_with_code = (
+        _date_columns(r[0]) + r[1:] + (access_code,) for r in rows
+    )
+    batch_size = _insert_rows_per_statement(conn)
+    sql_multi = _sql_insert_sales_multi(batch_size)
 
-    rows_with_code = [r + (access_code,) for r in rows]
+    # Satu transaksi eksplisit untuk seluruh batch (sekali fsync saat COMMIT)
+    inserted = 0
+    with _transaction(conn):
+        conn.execute(_SQL_INVALIDATE_DASHBOARD_CACHE, (access_code,))
+        while chunk := list(islice(rows_with_code, batch_size)):
+            inserted += len(chunk)
+            if len(chunk) == batch_size:
+                conn.execute(sql_multi, tuple(chain.from_iterable(chunk)))
+            else:
+                conn.executemany(_SQL_INSERT_SALES, chunk)
+
+        # Statistik planner diperbarui hanya kalau SQLite menilai sudah
+        # basi (bukan ANALYZE penuh di tiap upload); analysis_limit
+        # membatasi jumlah baris yang di-sampling
+        conn.execute("PRAGMA optimize;")
+    return inserted
 
-    cur = conn.cursor()
-    cur.executemany(
-        """
-        INSERT INTO sales_detail (
-            invoice_date,
-            invoice_no,
-            customer,
-            salesman,
-            item,
-            qty,
-            amount,
-            item_category,
-            city,
-            customer_type,
-            access_code
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-        """,
-        rows_with_code,
-    )
-    conn.commit()
+
+def replace_sales(
+    conn: sqlite3.Connection,
+    access_code: str,
+    rows: Iterable[tuple],
+    clear: bool,
+) -> int:
+    """
+    Import data baru untuk 1 access_code: clear_sales (kalau clear) lalu
+    insert_rows, dalam 1 transaksi. Kalau salah satunya gagal (misal file
+    rusak di tengah parse), data lama tetap utuh. JSON dashboard tersimpan
+    ikut dikosongkan (lihat dashboard_cache); dihitung ulang saat pertama
+    kali dibaca, bukan di sini (menahan writer).
+    Mengembalikan jumlah baris yang di-insert.
+    """
+    with _transaction(conn):
+        if clear:
+            clear_sales(conn, access_code)
+        return insert_rows(conn, rows, access_code)
 
 
 # ------------------ Helper untuk tanggal ------------------
 
+# Pola %Y-%m-%d | %d/%m/%Y | %d/%m/%y dalam 1 regex, dengan alternatif
+# hari/bulan yang sama seperti strptime (boleh 1 digit, hari boleh " 1").
+_DAY_RE = r"3[01]|[12]\d|0[1-9]|[1-9]| [1-9]"
+_MONTH_RE = r"1[0-2]|0[1-9]|[1-9]"
+_DATE_RE = re.compile(
+    rf"(\d{{4}})-({_MONTH_RE})-({_DAY_RE})"
+    rf"|({_DAY_RE})/({_MONTH_RE})/(\d{{4}}|\d{{2}})"
+)
+
 
+@lru_cache(maxsize=4096)
 def _parse_any_date(date_str: str):
     """
     Coba parse tanggal dalam beberapa format umum:
     - YYYY-MM-DD  (contoh: 2025-01-31)
     - DD/MM/YYYY  (contoh: 31/01/2025)
     - DD/MM/YY    (contoh: 31/01/25)
+    Ketiganya dikenali dari panjang + posisi pemisah lalu dibaca via slicing
+    (tanpa strptime yang lambat & tanpa exception per format yang meleset).
+    Bentuk lain (misal bulan/tanggal 1 digit) dicocokkan 1x dengan _DATE_RE.
+    Hasil di-cache karena tanggal faktur banyak yang berulang.
     """
     if not date_str:
         return None
 
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y"):
+    n = len(date_str)
+    if n == 10 and date_str[4] == "-" and date_str[7] == "-":
+        y, m, d = date_str[0:4], date_str[5:7], date_str[8:10]
+    elif n == 10 and date_str[2] == "/" and date_str[5] == "/":
+        y, m, d = date_str[6:10], date_str[3:5], date_str[0:2]
+    elif n == 8 and date_str[2] == "/" and date_str[5] == "/":
+        y, m, d = date_str[6:8], date_str[3:5], date_str[0:2]
+    else:
+        y = m = d = ""
+
+    # Hanya angka ASCII 0-9: isdigit() saja juga menerima superscript dsb.
+    # ("²") yang membuat int() error; bentuk lain lewat _DATE_RE di bawah.
+    ymd = y + m + d
+    if ymd.isascii() and ymd.isdecimal():
+        year = int(y)
+        if n == 8:
+            # Aturan %y strptime: 69-99 -> 19xx, 00-68 -> 20xx
+            year += 1900 if year >= 69 else 2000
         try:
-            return datetime.strptime(date_str, fmt).date()
+            return date(year, int(m), int(d))
         except ValueError:
-            continue
-    return None
+            # Bentuknya cocok tapi tanggalnya tidak ada (misal 31/02)
+            return None
 
+    match = _DATE_RE.fullmatch(date_str)
+    if match is None:
+        return None
+    iso_y, iso_m, iso_d, d, m, y = match.groups()
+    if iso_y is not None:
+        y, m, d = iso_y, iso_m, iso_d
+    year = int(y)
+    if len(y) == 2:
+        year += 1900 if year >= 69 else 2000
+    try:
+        return date(year, int(m), int(d))
+    except ValueError:
+        return None
 
-def fetch_sales(
+
+def _to_ordinal(date_str: str) -> int:
+    """Ubah tanggal (format apa pun yang dikenali) ke date.toordinal(). Gagal -> 0."""
+    d_val = _parse_any_date(date_str)
+    if d_val is None:
+        return 0
+    return d_val.toordinal()
+
+
+def _date_columns(date_str: str) -> Tuple[int, Optional[str]]:
+    """(invoice_date, invoice_date_raw) untuk insert_rows: teks asli hanya disimpan kalau tidak terbaca."""
+    ordinal = _to_ordinal(date_str)
+    if ordinal:
+        return ordinal, None
+    return 0, date_str
+
+
+def _date_bounds(
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> Optional[Tuple[int, int]]:
+    """
+    Filter tanggal -> (batas bawah, batas atas) nomor hari untuk
+    "invoice_date BETWEEN ? AND ?", None kalau tidak ada filter.
+    Batas bawah 1 supaya tanggal yang tidak terbaca (0) tetap
+    tidak ikut terfilter, sama seperti perilaku filter sebelumnya.
+    """
+    start_d = _parse_any_date(start_date) if start_date else None
+    end_d = _parse_any_date(end_date) if end_date else None
+    if not (start_d or end_d):
+        return None
+    return (
+        start_d.toordinal() if start_d else 1,
+        end_d.toordinal() if end_d else date.max.toordinal(),
+    )
+
+
+def _execute_sales_query(
+    conn: sqlite3.Connection,
+    sql: str,
+    sql_range: str,
+    access_code: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+) -> sqlite3.Cursor:
+    """
+    Jalankan query sales_detail untuk 1 access_code, pakai versi *_RANGE
+    kalau ada filter tanggal. Tanggal di DB berupa nomor hari (lihat
+    insert_rows & init_db), jadi filter tanggal adalah range integer di SQL
+    yang memakai idx_sales_covering.
+    """
+    cur = conn.cursor()
+    bounds = _date_bounds(start_date, end_date)
+    if bounds:
+        cur.execute(sql_range, (access_code,) + bounds)
+    else:
+        cur.execute(sql, (access_code,))
+    return cur
+
+
+def _iter_cursor(cur: sqlite3.Cursor) -> Iterator[tuple]:
+    try:
+        yield from cur
+    finally:
+        # Tutup statement walau generator berhenti di tengah jalan
+        cur.close()
+
+
+def iter_sales(
     conn: sqlite3.Connection,
     access_code: Optional[str],
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-) -> List[Dict[str, Any]]:
+) -> Iterator[tuple]:
     """
-    Ambil data untuk dikirim ke dashboard, khusus untuk 1 access_code.
+    Generator data penjualan untuk 1 access_code, tuple per baris
+    dengan urutan kolom SALES_COLUMNS. Baris dibaca langsung dari cursor
+    (tanpa fetchall), jadi cocok untuk di-stream ke response.
     start_date & end_date format 'YYYY-MM-DD' (dari input <input type="date">).
-    Tanggal di DB boleh format:
-    - YYYY-MM-DD
-    - DD/MM/YYYY
-    - DD/MM/YY
-    Filter tanggal dilakukan di Python.
+    invoice_date di hasil tetap teks YYYY-MM-DD (teks asli kalau tidak terbaca).
+    """
+    if not access_code:
+        return iter(())
+    return _iter_cursor(
+        _execute_sales_query(
+            conn, _SQL_FETCH_SALES, _SQL_FETCH_SALES_RANGE, access_code, start_date, end_date
+        )
+    )
+
+
+def last_month_code(
+    conn: sqlite3.Connection,
+    access_code: Optional[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Kode bulan (tahun * 12 + bulan - 1) dari faktur terakhir yang ikut filter,
+    dipakai sebagai "bulan ini" di fetch_dashboard_aggregates_parallel.
+    None kalau tidak ada tanggal yang terbaca.
     """
     if not access_code:
-        return []
+        return None
+    cur = _execute_sales_query(
+        conn,
+        _SQL_LAST_INVOICE_DATE,
+        _SQL_LAST_INVOICE_DATE_RANGE,
+        access_code,
+        start_date,
+        end_date,
+    )
+    (last,) = cur.fetchone()
+    cur.close()
+    if last is None:
+        return None
+    last_d = date.fromordinal(last)
+    return last_d.year * 12 + last_d.month - 1
 
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT
-            invoice_date,
-            invoice_no,
-            customer,
-            salesman,
-            item,
-            qty,
-            amount,
-            item_category,
-            city,
-            customer_type
-        FROM sales_detail
-        WHERE access_code = ?
-        """,
-        (access_code,),
+
+def _month_start(month_code: int) -> int:
+    """Nomor hari tanggal 1 untuk kode bulan (tahun * 12 + bulan - 1)."""
+    return date(month_code // 12, month_code % 12 + 1, 1).toordinal()
+
+
+def _dashboard_summary(conn: sqlite3.Connection, params: tuple) -> tuple:
+    return conn.execute(_SQL_DASHBOARD_SUMMARY, params).fetchone()
+
+
+def _dashboard_top(conn: sqlite3.Connection, col: str, params: tuple, top_n: int) -> List[tuple]:
+    return conn.execute(_SQL_DASHBOARD_TOP_BY_COL[col], params + (top_n,)).fetchall()
+
+
+def _dashboard_months(
+    conn: sqlite3.Connection,
+    access_code: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    lo: int,
+    hi: int,
+    top_n: int,
+) -> Tuple[Optional[int], Optional[tuple], Dict[str, List[tuple]]]:
+    """(base_month, month_totals, mom) untuk fetch_dashboard_aggregates_parallel."""
+    mom: Dict[str, List[tuple]] = {col: [] for col in _SQL_DASHBOARD_MOM_TOP_BY_COL}
+    base_month = last_month_code(conn, access_code, start_date, end_date)
+    if base_month is None:
+        return None, None, mom
+
+    # Cukup baca dari awal bulan lalu; faktur terakhir ada di bulan ini,
+    # jadi semua yang >= awal bulan ini pasti masuk bulan ini.
+    cur_start = _month_start(base_month)
+    month_params = (cur_start, access_code, max(lo, _month_start(base_month - 1)), hi)
+    month_totals = conn.execute(_SQL_DASHBOARD_MONTH_TOTALS, month_params).fetchone()
+    for col, sql in _SQL_DASHBOARD_MOM_TOP_BY_COL.items():
+        mom[col] = [row[:3] for row in conn.execute(sql, month_params + (top_n,))]
+    return base_month, month_totals, mom
+
+
+def _dashboard_jobs(
+    access_code: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    top_n: int,
+) -> List[Tuple[str, Any, tuple]]:
+    """
+    Query dashboard yang saling independen: (key, func, args), dijalankan
+    sebagai func(conn, *args), masing-masing di koneksi pool sendiri
+    (lihat fetch_dashboard_aggregates_parallel).
+    """
+    # Tanpa filter: batas bawah 0 supaya tanggal yang tidak terbaca ikut dihitung
+    lo, hi = _date_bounds(start_date, end_date) or (0, date.max.toordinal())
+    params = (access_code, lo, hi)
+    jobs = [("summary", _dashboard_summary, (params,))]
+    jobs += [(col, _dashboard_top, (col, params, top_n)) for col in DASHBOARD_DIMENSIONS]
+    jobs.append(
+        ("months", _dashboard_months, (access_code, start_date, end_date, lo, hi, top_n))
     )
-    rows = [dict(row) for row in cur.fetchall()]
+    return jobs
 
-    # Kalau tidak ada filter, langsung kembalikan semua
-    if not start_date and not end_date:
-        return rows
 
-    start_d = None
-    end_d = None
-    if start_date:
-        start_d = datetime.strptime(start_date, "%Y-%m-%d").date()
-    if end_date:
-        end_d = datetime.strptime(end_date, "%Y-%m-%d").date()
+def _dashboard_result(results: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Susun hasil _dashboard_jobs (None = tanpa access_code) jadi dict fetch_dashboard_aggregates_parallel."""
+    if results is None:
+        return {
+            "total_sales": 0,
+            "customer_count": 0,
+            "top": {col: [] for col in DASHBOARD_DIMENSIONS},
+            "base_month": None,
+            "month_totals": None,
+            "mom": {col: [] for col in _SQL_DASHBOARD_MOM_TOP_BY_COL},
+        }
+    total_sales, customer_count = results["summary"]
+    base_month, month_totals, mom = results["months"]
+    return {
+        "total_sales": total_sales,
+        "customer_count": customer_count,
+        "top": {col: results[col] for col in DASHBOARD_DIMENSIONS},
+        "base_month": base_month,
+        "month_totals": month_totals,
+        "mom": mom,
+    }
 
-    filtered: List[Dict[str, Any]] = []
-    for r in rows:
-        d_val = _parse_any_date(r.get("invoice_date"))
-        if not d_val:
-            continue
 
-        if start_d and d_val < start_d:
-            continue
-        if end_d and d_val > end_d:
-            continue
+# Thread untuk query baca paralel. sqlite3 melepas GIL selama query jalan,
+# jadi beberapa query di koneksi berbeda benar-benar jalan bersamaan.
+_read_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="sqlite-read")
 
-        filtered.append(r)
 
-    return filtered
+def _run_pooled(func, *args) -> Any:
+    with acquire() as conn:
+        return func(conn, *args)
+
+
+def fetch_dashboard_aggregates_parallel(
+    access_code: Optional[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    top_n: int = 10,
+) -> Dict[str, Any]:
+    """
+    Semua angka dashboard untuk 1 access_code, dihitung dengan GROUP BY di
+    SQLite (Python hanya menerima hasil yang sudah kecil):
+
+    - total_sales, customer_count
+    - top: {dimensi: [(label, amount), ...]} Top N per DASHBOARD_DIMENSIONS
+    - base_month: kode bulan "bulan ini" (lihat last_month_code), atau None
+    - month_totals: (total bulan ini, total bulan lalu), None kalau base_month None
+    - mom: {"item"/"salesman": [(label, bulan ini, bulan lalu), ...]}
+
+    amount selalu integer rupiah (NULL dihitung 0).
+
+    Tiap query independen (ringkasan, Top N per dimensi, bulan ini vs bulan
+    lalu, lihat _dashboard_jobs) jalan paralel, masing-masing di koneksi
+    pool sendiri. Pemanggil tidak perlu (dan sebaiknya tidak) sedang
+    meminjam koneksi pool, supaya job tidak menunggu koneksi yang dipegang
+    pemanggilnya sendiri.
+    """
+    if not access_code:
+        return _dashboard_result(None)
+    futures = {
+        key: _read_executor.submit(_run_pooled, func, *args)
+        for key, func, args in _dashboard_jobs(access_code, start_date, end_date, top_n)
+    }
+    return _dashboard_result({key: f.result() for key, f in futures.items()})
+
+
+def _iter_cursor_chunks(cur: sqlite3.Cursor, size: int) -> Iterator[List[tuple]]:
+    try:
+        while rows := cur.fetchmany(size):
+            yield rows
+    finally:
+        cur.close()
+
+
+def iter_sales_chunks(
+    conn: sqlite3.Connection,
+    access_code: Optional[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    size: int = 1000,
+) -> Iterator[List[tuple]]:
+    """
+    Seperti iter_sales, tapi per potongan list berisi maksimal size baris
+    (cursor.fetchmany, jadi pemotongannya di C). Cocok untuk stream response
+    per chunk tanpa menampung semua baris di memori.
+    """
+    if not access_code:
+        return iter(())
+    return _iter_cursor_chunks(
+        _execute_sales_query(
+            conn, _SQL_FETCH_SALES, _SQL_FETCH_SALES_RANGE, access_code, start_date, end_date
+        ),
+        size,
+    )
+
+
+def fetch_sales(
+    conn: sqlite3.Connection,
+    access_code: Optional[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sama seperti iter_sales, tapi dikembalikan sebagai list of dict.
+    Untuk hasil besar (misal endpoint /sales) pakai iter_sales saja.
+    """
+    cols = SALES_COLUMNS
+    return [
+        dict(zip(cols, row))
+        for row in iter_sales(conn, access_code, start_date, end_date)
+    ]
 
 
 # ================== FUNGSI UNTUK KODE AKSES ==================
 
 
+def upsert_access_codes(conn: sqlite3.Connection, rows: Iterable[tuple]) -> None:
+    """
+    Tambah / update banyak kode akses sekaligus (1 transaksi, 1x COMMIT).
+    Tiap row: (code, customer_name, active, valid_from, valid_to).
+    Kalau code sudah ada -> update datanya.
+    """
+    with _transaction(conn):
+        conn.executemany(_SQL_UPSERT_CODE, rows)
+
+
 def upsert_access_code(
     conn: sqlite3.Connection,
     code: str,
@@ -227,23 +1106,10 @@ def upsert_access_code(
     valid_to: Optional[str] = None,
 ) -> None:
     """
-    Tambah / update kode akses.
+    Tambah / update 1 kode akses.
     Kalau code sudah ada -> update datanya.
     """
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO access_codes (code, customer_name, active, valid_from, valid_to)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(code) DO UPDATE SET
-            customer_name = excluded.customer_name,
-            active        = excluded.active,
-            valid_from    = excluded.valid_from,
-            valid_to      = excluded.valid_to;
-        """,
-        (code, customer_name, active, valid_from, valid_to),
-    )
-    conn.commit()
+    upsert_access_codes(conn, [(code, customer_name, active, valid_from, valid_to)])
 
 
 def get_active_access_code(
@@ -256,24 +1122,65 @@ def get_active_access_code(
     - ada di tabel
     - active = 1
     - dan masih dalam masa berlaku (kalau valid_from / valid_to diisi)
+    Mengembalikan detail kode (untuk admin). Untuk sekadar cek valid,
+    pakai is_access_code_valid.
     """
     if today is None:
         today = date.today().isoformat()
 
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT *
-        FROM access_codes
-        WHERE
-            code = ?
-            AND active = 1
-            AND (valid_from IS NULL OR valid_from <= ?)
-            AND (valid_to   IS NULL OR valid_to   >= ?)
-        """,
-        (code, today, today),
-    )
-    row = cur.fetchone()
+    row = conn.execute(_SQL_GET_CODE, (code, today, today)).fetchone()
     if not row:
         return None
-    return dict(row)
\ No newline at end of file
+    return dict(zip(_ACCESS_CODE_COLUMNS, row))
+
+
+def is_access_code_valid(
+    conn: sqlite3.Connection,
+    code: str,
+    today: Optional[str] = None,
+) -> bool:
+    """
+    Versi ringan get_active_access_code untuk cek login / cookie:
+    cukup True/False, tanpa mengambil isi baris.
+    """
+    if today is None:
+        today = date.today().isoformat()
+
+    return bool(conn.execute(_SQL_CHECK_CODE, (code, today, today)).fetchone()[0])
+
+
+# ------------------ Cache JSON dashboard ------------------
+
+
+def store_dashboard_cache(
+    conn: sqlite3.Connection,
+    access_code: str,
+    generation: int,
+    version: int,
+    data: bytes,
+) -> None:
+    """
+    Simpan JSON dashboard (tanpa filter tanggal) untuk 1 access_code.
+    generation = nilai dari get_dashboard_cache sebelum JSON dihitung; kalau
+    data sudah berubah lagi sejak itu, JSON ini tidak disimpan.
+    """
+    conn.execute(_SQL_STORE_DASHBOARD_CACHE, (access_code, generation, version, data))
+
+
+def get_dashboard_cache(
+    conn: sqlite3.Connection,
+    access_code: str,
+    version: int,
+) -> Tuple[Optional[bytes], int]:
+    """
+    (JSON dashboard tersimpan, generation) untuk 1 access_code. JSON None
+    kalau belum ada, sudah kedaluwarsa, atau versinya bukan version.
+    """
+    row = conn.execute(
+        "SELECT data, version, generation FROM dashboard_cache WHERE access_code = ?;",
+        (access_code,),
+    ).fetchone()
+    if row is None:
+        return None, 0
+    data, row_version, generation = row
+    return (data if row_version == version else None), generation
@@ -1,34 +1,24 @@
 from datetime import date, timedelta
 
-from database import get_connection, init_db, upsert_access_code
+from database import get_connection, init_db, upsert_access_codes
 
 
 def main():
     conn = get_connection()
     init_db(conn)
 
-    # Contoh: bikin 2 kode akses
-
-    # 1) Kode DEMO, tanpa masa kadaluarsa (valid_from/to = None)
-    upsert_access_code(
-        conn,
-        code="DEMO-1234",
-        customer_name="Demo Customer",
-        active=1,
-        valid_from=None,
-        valid_to=None,
-    )
-
-    # 2) Kode untuk PT Contoh Sukses, berlaku 1 tahun dari hari ini
+    # Contoh: bikin 2 kode akses (sekali simpan)
+    # Tiap baris: (code, customer_name, active, valid_from, valid_to)
     today = date.today()
     one_year = today + timedelta(days=365)
-    upsert_access_code(
+    upsert_access_codes(
         conn,
-        code="ABC-2025",
-        customer_name="PT Contoh Sukses",
-        active=1,
-        valid_from=today.isoformat(),
-        valid_to=one_year.isoformat(),
+        [
+            # 1) Kode DEMO, tanpa masa kadaluarsa (valid_from/to = None)
+            ("DEMO-1234", "Demo Customer", 1, None, None),
+            # 2) Kode untuk PT Contoh Sukses, berlaku 1 tahun dari hari ini
+            ("ABC-2025", "PT Contoh Sukses", 1, today.isoformat(), one_year.isoformat()),
+        ],
     )
 
     conn.close()
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime
-from typing import List, Tuple, Optional
+from datetime import date
+from functools import lru_cache
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+import codecs
+import io
+import operator
 import re
 
-from bs4 import BeautifulSoup
+from lxml import etree
 
 # Mapping nama bulan Indo/Eng ke angka
 MONTH_MAP = {
@@ -27,39 +30,44 @@ MONTH_MAP = {
     "DES": 12,
 }
 
+# Isi kolom Date yang menandakan baris header / kosong / total, bukan transaksi
+_SKIP_DATE_TEXT = frozenset({"", "Date", "Tanggal", "TOTAL"})
+
+# Karakter yang dibuang _parse_number: semua selain 0-9 dan "-"
+_NON_NUMBER_RE = re.compile(r"[^0-9-]")
+_NUMBER_DELETE = str.maketrans(
+    "", "", "".join(chr(c) for c in range(128) if not (chr(c).isdigit() or chr(c) == "-"))
+)
+
+# Indeks <td> kolom No. Faktur s/d Customer Type (lihat _row_from_tr);
+# kolom Date (indeks 1) dibaca terpisah untuk cek baris header / total
+_COL_GETTER = operator.itemgetter(5, 9, 13, 17, 21, 25, 29, 33, 37)
+
+
+class SalesRow(NamedTuple):
+    """
+    Satu baris transaksi. Berupa tuple (urutan field = urutan kolom
+    insert_rows), jadi bisa langsung dikirim ke insert_rows tanpa konversi.
+    """
 
-@dataclass
-class SalesRow:
     invoice_date: str
     invoice_no: str
     customer: str
     salesman: str
     item: str
     qty: Optional[float]
-    amount: Optional[float]
+    amount: Optional[int]
     item_category: Optional[str]
     city: Optional[str]
     customer_type: Optional[str]
 
-    def to_tuple(self) -> Tuple:
-        return (
-            self.invoice_date,
-            self.invoice_no,
-            self.customer,
-            self.salesman,
-            self.item,
-            self.qty,
-            self.amount,
-            self.item_category,
-            self.city,
-            self.customer_type,
-        )
-
 
+@lru_cache(maxsize=4096)
 def _parse_date(text: str) -> str:
     """
     Contoh: '01 Des 2025' -> '2025-12-01'
     Kalau gagal, balikin text aslinya.
+    Di-cache: 1 faktur berisi banyak baris item dengan tanggal yang sama.
     """
     text = text.strip()
     if not text:
@@ -75,10 +83,12 @@ def _parse_date(text: str) -> str:
     try:
         day = int(day_str)
         year = int(year_str)
-        dt = datetime(year, month, day)
-        return dt.strftime("%Y-%m-%d")
+        # date() hanya untuk validasi (tanggal 31 Feb dsb. -> ValueError);
+        # teks hasil dirakit langsung, tanpa strftime
+        date(year, month, day)
     except Exception:
         return text
+    return f"{year}-{month:02d}-{day:02d}"
 
 
 def _parse_number(text: str) -> Optional[float]:
@@ -89,7 +99,12 @@ def _parse_number(text: str) -> Optional[float]:
     text = text.strip()
     if not text:
         return None
-    cleaned = re.sub(r"[^0-9-]", "", text)
+    # Angka Accurate hampir selalu ASCII -> str.translate (hapus semua
+    # karakter selain 0-9 dan "-"), regex hanya untuk teks non-ASCII
+    if text.isascii():
+        cleaned = text.translate(_NUMBER_DELETE)
+    else:
+        cleaned = _NON_NUMBER_RE.sub("", text)
     if not cleaned or cleaned == "-":
         return None
     try:
@@ -98,9 +113,32 @@ def _parse_number(text: str) -> Optional[float]:
         return None
 
 
+def _parse_amount(text: str) -> Optional[int]:
+    """Nilai rupiah dibulatkan ke integer (tanpa pecahan). Kosong / '-' -> None."""
+    value = _parse_number(text)
+    if value is None:
+        return None
+    return int(round(value))
+
+
 def parse_html_content(html: str) -> List[SalesRow]:
+    """Parse isi HTML Accurate (string) jadi list SalesRow."""
+    return list(iter_html_rows(html))
+
+
+def iter_html_rows(html: str) -> Iterator[SalesRow]:
+    """Sama dengan iter_html_file, tapi input-nya string HTML."""
+    return iter_html_file(io.BytesIO(html.encode("utf-8")))
+
+
+def _cell_text(td) -> str:
+    """Padanan BeautifulSoup get_text(strip=True): tiap potongan teks di-strip lalu digabung."""
+    return "".join(s.strip() for s in td.itertext())
+
+
+def _row_from_tr(tr) -> Optional[SalesRow]:
     """
-    Parse isi HTML Accurate (string) jadi list SalesRow.
+    Ambil SalesRow dari satu elemen <tr>; None kalau bukan baris data.
 
     Berdasarkan sample:
     - kolom  1 : Date
@@ -114,43 +152,91 @@ def parse_html_content(html: str) -> List[SalesRow]:
     - kolom 33 : City
     - kolom 37 : Customer Type
     """
-    soup = BeautifulSoup(html, "html.parser")
-    records: List[SalesRow] = []
-
-    for tr in soup.find_all("tr"):
-        tds = tr.find_all("td")
-        # baris data punya banyak kolom (sekitar 41 kolom)
-        if len(tds) < 38:
-            continue
-
-        date_text = tds[1].get_text(strip=True)
-
-        # skip baris header / kosong
-        if not date_text or date_text == "Date":
-            continue
-
-        invoice_no = tds[5].get_text(strip=True)
-        customer = tds[9].get_text(strip=True)
-        salesman = tds[13].get_text(strip=True)
-        item = tds[17].get_text(strip=True)
-        qty_text = tds[21].get_text(strip=True)
-        amount_text = tds[25].get_text(strip=True)
-        item_category = tds[29].get_text(strip=True) if len(tds) > 29 else ""
-        city = tds[33].get_text(strip=True) if len(tds) > 33 else ""
-        customer_type = tds[37].get_text(strip=True) if len(tds) > 37 else ""
-
-        row = SalesRow(
-            invoice_date=_parse_date(date_text),
-            invoice_no=invoice_no,
-            customer=customer,
-            salesman=salesman,
-            item=item,
-            qty=_parse_number(qty_text),
-            amount=_parse_number(amount_text),
-            item_category=item_category or None,
-            city=city or None,
-            customer_type=customer_type or None,
-        )
-        records.append(row)
-
-    return records
\ No newline at end of file
+    tds = list(tr.iter("td"))
+    # baris data punya banyak kolom (sekitar 41 kolom)
+    if len(tds) < 38:
+        return None
+
+    # skip baris header / kosong / total
+    date_text = _cell_text(tds[1])
+    if date_text in _SKIP_DATE_TEXT:
+        return None
+
+    (
+        invoice_no,
+        customer,
+        salesman,
+        item,
+        qty_text,
+        amount_text,
+        item_category,
+        city,
+        customer_type,
+    ) = map(_cell_text, _COL_GETTER(tds))
+
+    return SalesRow(
+        invoice_date=_parse_date(date_text),
+        invoice_no=invoice_no,
+        customer=customer,
+        salesman=salesman,
+        item=item,
+        qty=_parse_number(qty_text),
+        amount=_parse_amount(amount_text),
+        item_category=item_category or None,
+        city=city or None,
+        customer_type=customer_type or None,
+    )
+
+
+class _Utf8IgnoreReader:
+    """
+    Bungkus file object biner: isinya diteruskan per potongan sebagai UTF-8
+    valid, byte yang bukan UTF-8 dibuang (sama dengan
+    bytes.decode("utf-8", errors="ignore")).
+    """
+
+    def __init__(self, fileobj: BinaryIO) -> None:
+        self._fileobj = fileobj
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof:
+            chunk = self._fileobj.read(size)
+            self._eof = not chunk
+            text = self._decoder.decode(chunk, final=self._eof)
+            # b"" berarti EOF bagi lxml, jadi potongan yang isinya habis
+            # dibuang semua harus dilewati
+            if text:
+                return text.encode("utf-8")
+        return b""
+
+
+def iter_html_file(fileobj: BinaryIO) -> Iterator[SalesRow]:
+    """
+    Parse file HTML Accurate (file object biner) secara streaming: elemen
+    <tr> diproses satu per satu lalu dibuang, jadi isi file tidak pernah
+    ditampung utuh sebagai bytes / string / DOM. SalesRow di-yield satu
+    per satu, jadi bisa langsung dialirkan ke insert_rows.
+    File kosong / tidak bisa di-parse -> tidak ada baris (bukan error).
+    """
+    events = etree.iterparse(
+        _Utf8IgnoreReader(fileobj), events=("end",), tag="tr", html=True, encoding="utf-8"
+    )
+    while True:
+        try:
+            _, tr = next(events)
+        except (StopIteration, etree.XMLSyntaxError):
+            return
+
+        row = _row_from_tr(tr)
+
+        # baris sudah dibaca -> bebaskan elemen ini dan saudara sebelumnya
+        tr.clear(keep_tail=True)
+        parent = tr.getparent()
+        if parent is not None:
+            while tr.getprevious() is not None:
+                del parent[0]
+
+        if row is not None:
+            yield row
\ No newline at end of file
@@ -0,0 +1,318 @@
+// ======= GLOBAL VAR UNTUK CHART =======
+let chartCustomer = null;
+let chartComposition = null;
+let chartCustomerType = null;
+let chartCity = null;
+let chartSalesman = null;
+let chartItem = null;
+let chartCategory = null;
+let chartTotalMoM = null;
+let chartItemMoM = null;
+let chartSalesmanMoM = null;
+
+const PALETTE = [
+    "rgba(56,189,248,0.85)",
+    "rgba(96,165,250,0.85)",
+    "rgba(52,211,153,0.85)",
+    "rgba(250,204,21,0.85)",
+    "rgba(248,113,113,0.85)",
+    "rgba(167,139,250,0.85)",
+    "rgba(251,146,60,0.85)",
+    "rgba(45,212,191,0.85)",
+    "rgba(244,114,182,0.85)",
+    "rgba(129,140,248,0.85)"
+];
+
+function formatRupiah(value) {
+    if (!value) return "0";
+    return Number(value).toLocaleString('id-ID');
+}
+
+function updateMetricCards(data) {
+    const total = data.total_sales || 0;
+    const custCount = data.customer_count || 0;
+    const topCustomer = data.top_customer || "-";
+
+    document.getElementById("metricTotal").innerText = "Rp " + formatRupiah(total);
+    document.getElementById("metricCustomer").innerText = custCount;
+    document.getElementById("metricTopCustomer").innerText = topCustomer;
+
+    const cur = data.total_month_current;
+    const prev = data.total_month_prev;
+    const diff = data.total_month_diff;
+    const pct = data.total_month_diff_pct;
+
+    let text = "Belum ada data bulan ini / bulan lalu";
+    if (cur !== null && prev !== null) {
+        const sign = (diff || 0) >= 0 ? "+" : "";
+        const pctText = (pct === null || pct === undefined)
+            ? ""
+            : " (" + (pct * 100).toFixed(1) + "%)";
+        text = sign + "Rp " + formatRupiah(diff || 0) + pctText;
+    }
+    document.getElementById("metricTotalMoM").innerText =
+        "Kenaikan/Penurunan vs Bulan Lalu: " + text;
+}
+
+function baseChartOptions() {
+    return {
+        responsive: true,
+        maintainAspectRatio: false,
+        plugins: {
+            legend: {
+                labels: {
+                    color: "#e5e7eb",
+                    font: { size: 11 }
+                }
+            }
+        },
+        scales: {
+            x: {
+                ticks: { color: "#e5e7eb", maxRotation: 45, minRotation: 0 },
+                grid: { color: "rgba(148,163,184,0.25)" }
+            },
+            y: {
+                beginAtZero: true,
+                ticks: { color: "#e5e7eb" },
+                grid: { color: "rgba(148,163,184,0.18)" }
+            }
+        }
+    };
+}
+
+// Chart yang sudah ada cukup diganti datanya lalu update("none") (tanpa
+// animasi), bukan destroy() + new Chart() di tiap loadDashboard().
+function createOrUpdateBarChart(oldChart, canvasId, labels, values, title) {
+    if (oldChart) {
+        oldChart.data.labels = labels;
+        oldChart.data.datasets[0].data = values;
+        oldChart.update("none");
+        return oldChart;
+    }
+    const ctx = document.getElementById(canvasId).getContext("2d");
+    return new Chart(ctx, {
+        type: "bar",
+        data: {
+            labels: labels,
+            datasets: [{
+                label: title,
+                data: values,
+                backgroundColor: "rgba(56,189,248,0.9)",
+                borderRadius: 6,
+            }]
+        },
+        options: baseChartOptions()
+    });
+}
+
+function createOrUpdateBarChartMulti(oldChart, canvasId, labels, datasets) {
+    if (oldChart) {
+        oldChart.data.labels = labels;
+        datasets.forEach((d, idx) => {
+            oldChart.data.datasets[idx].data = d.data;
+        });
+        oldChart.update("none");
+        return oldChart;
+    }
+    const ctx = document.getElementById(canvasId).getContext("2d");
+    const ds = datasets.map((d, idx) => ({
+        ...d,
+        backgroundColor: idx === 0
+            ? "rgba(56,189,248,0.9)"
+            : "rgba(96,165,250,0.9)",
+        borderRadius: 5,
+    }));
+    return new Chart(ctx, {
+        type: "bar",
+        data: {
+            labels: labels,
+            datasets: ds
+        },
+        options: baseChartOptions()
+    });
+}
+
+function createOrUpdatePieChart(oldChart, canvasId, labels, values, title) {
+    const colors = labels.map((_, i) => PALETTE[i % PALETTE.length]);
+    if (oldChart) {
+        oldChart.data.labels = labels;
+        oldChart.data.datasets[0].data = values;
+        oldChart.data.datasets[0].backgroundColor = colors;
+        oldChart.update("none");
+        return oldChart;
+    }
+    const ctx = document.getElementById(canvasId).getContext("2d");
+    return new Chart(ctx, {
+        type: "pie",
+        data: {
+            labels: labels,
+            datasets: [{
+                label: title,
+                data: values,
+                backgroundColor: colors,
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    labels: {
+                        color: "#e5e7eb",
+                        font: { size: 11 }
+                    }
+                }
+            }
+        }
+    });
+}
+
+async function loadDashboard() {
+    const start = document.getElementById("start_date").value;
+    const end = document.getElementById("end_date").value;
+
+    let url = "/dashboard-data";
+    const params = [];
+    if (start) params.push("start_date=" + encodeURIComponent(start));
+    if (end) params.push("end_date=" + encodeURIComponent(end));
+    if (params.length > 0) {
+        url += "?" + params.join("&");
+    }
+
+    const resp = await fetch(url);
+    if (!resp.ok) {
+        alert("Gagal mengambil data dashboard (mungkin belum ada data / kode akses belum benar).");
+        return;
+    }
+    const data = await resp.json();
+
+    // Update kartu
+    updateMetricCards(data);
+
+    // Top 10 Customer (bar)
+    // Top N sudah berupa {labels, values} dari server
+    let lv = data.top10_customer;
+    chartCustomer = createOrUpdateBarChart(
+        chartCustomer,
+        "chartCustomer",
+        lv.labels,
+        lv.values,
+        "Total Penjualan"
+    );
+
+    // Komposisi Top 10 Customer (pie)
+    chartComposition = createOrUpdatePieChart(
+        chartComposition,
+        "chartComposition",
+        lv.labels,
+        lv.values,
+        "Komposisi Penjualan"
+    );
+
+    // Customer Type
+    lv = data.top10_customer_type;
+    chartCustomerType = createOrUpdateBarChart(
+        chartCustomerType,
+        "chartCustomerType",
+        lv.labels,
+        lv.values,
+        "Total Penjualan"
+    );
+
+    // Kota
+    lv = data.top10_city;
+    chartCity = createOrUpdateBarChart(
+        chartCity,
+        "chartCity",
+        lv.labels,
+        lv.values,
+        "Total Penjualan"
+    );
+
+    // Salesman
+    lv = data.top10_salesman;
+    chartSalesman = createOrUpdateBarChart(
+        chartSalesman,
+        "chartSalesman",
+        lv.labels,
+        lv.values,
+        "Total Penjualan"
+    );
+
+    // Barang (Top 10)
+    lv = data.top10_item;
+    chartItem = createOrUpdateBarChart(
+        chartItem,
+        "chartItem",
+        lv.labels,
+        lv.values,
+        "Total Penjualan"
+    );
+
+    // Kategori Barang (Top 10)
+    lv = data.top10_category;
+    chartCategory = createOrUpdateBarChart(
+        chartCategory,
+        "chartCategory",
+        lv.labels,
+        lv.values,
+        "Total Penjualan"
+    );
+
+    // ===== Analisa Total Penjualan Bulan Ini vs Bulan Lalu =====
+    const totalCurr = data.total_month_current || 0;
+    const totalPrev = data.total_month_prev || 0;
+    chartTotalMoM = createOrUpdateBarChart(
+        chartTotalMoM,
+        "chartTotalMoM",
+        ["Bulan Lalu", "Bulan Ini"],
+        [totalPrev, totalCurr],
+        "Total Penjualan"
+    );
+
+    // ===== Penjualan per Barang Bulan Ini vs Bulan Lalu (Top 10) =====
+    const itemMoM = data.item_mom_top10;
+    chartItemMoM = createOrUpdateBarChartMulti(
+        chartItemMoM,
+        "chartItemMoM",
+        itemMoM.labels,
+        [
+            {
+                label: "Bulan Ini",
+                data: itemMoM.current,
+            },
+            {
+                label: "Bulan Lalu",
+                data: itemMoM.previous,
+            }
+        ]
+    );
+
+    // ===== Penjualan per Salesman Bulan Ini vs Bulan Lalu (Top 10) =====
+    const smMoM = data.salesman_mom_top10;
+    chartSalesmanMoM = createOrUpdateBarChartMulti(
+        chartSalesmanMoM,
+        "chartSalesmanMoM",
+        smMoM.labels,
+        [
+            {
+                label: "Bulan Ini",
+                data: smMoM.current,
+            },
+            {
+                label: "Bulan Lalu",
+                data: smMoM.previous,
+            }
+        ]
+    );
+}
+
+document.addEventListener("DOMContentLoaded", function() {
+    // pertama kali load dashboard tanpa filter
+    loadDashboard();
+
+    // tombol filter
+    document.getElementById("btnFilter").addEventListener("click", function() {
+        loadDashboard();
+    });
+});